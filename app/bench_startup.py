@@ -0,0 +1,76 @@
+""" Measures how long a fresh web worker takes to import main.py and how much memory it holds afterwards.
+Run it from the app folder (config.py is needed) like: python bench_startup.py --runs 5
+Exits with 1 if the median startup time or RSS goes over the limits or if an import only module
+(pandas, numpy, ...) is loaded by the web app, so it can guard against startup regressions. """
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# modules only the import job (import_db.py) may load
+IMPORT_ONLY_MODULES = ('pandas', 'numpy', 'openpyxl')
+
+WORKER = f"""
+import json
+import sys
+import time
+
+start = time.perf_counter()
+import main
+seconds = time.perf_counter() - start
+
+rss_kb = 0
+with open('/proc/self/status') as f:
+    for line in f:
+        if line.startswith('VmRSS:'):
+            rss_kb = int(line.split()[1])
+
+print(json.dumps({{'seconds': seconds, 'rss_mb': rss_kb / 1024,
+                  'import_only': [m for m in {IMPORT_ONLY_MODULES!r} if m in sys.modules]}}))
+"""
+
+
+def measure_worker():
+    """ Imports main.py in a fresh interpreter, the way a uWSGI worker does, and returns its measurements """
+    worker = subprocess.run([sys.executable, '-c', WORKER],
+                            capture_output=True, text=True)
+    if worker.returncode != 0:
+        # e.g. no config.py or a missing package, show why main.py could not be imported
+        print(worker.stderr, end='', file=sys.stderr)
+        sys.exit(f'importing main.py failed with exit code {worker.returncode}')
+    output = worker.stdout
+    # main.py may print while loading (e.g. the lookup snapshot), the result is the last line
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-seconds', type=float, default=1.0)
+    parser.add_argument('--max-rss-mb', type=float, default=80)
+    args = parser.parse_args()
+
+    results = [measure_worker() for _ in range(args.runs)]
+    seconds = statistics.median(result['seconds'] for result in results)
+    rss_mb = statistics.median(result['rss_mb'] for result in results)
+    import_only = sorted({m for result in results for m in result['import_only']})
+
+    print(f'startup: {seconds:.3f}s (max {args.max_seconds}s), '
+          f'rss: {rss_mb:.1f}MB (max {args.max_rss_mb}MB), median of {args.runs} runs')
+
+    failed = False
+    if seconds > args.max_seconds:
+        print('startup time is over the limit')
+        failed = True
+    if rss_mb > args.max_rss_mb:
+        print('worker rss is over the limit')
+        failed = True
+    if import_only:
+        print(f'web app loads import only modules: {", ".join(import_only)}')
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
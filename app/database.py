@@ -0,0 +1,102 @@
+import random
+import time
+
+import config
+import MySQLdb
+
+# seconds to wait for a replica before trying the next one
+REPLICA_CONNECT_TIMEOUT = 1
+# seconds a replica lag check result is trusted before checking again
+REPLICA_CHECK_INTERVAL = 5
+
+# mysql error code for a missing privilege, e.g. REPLICATION CLIENT for SHOW REPLICA STATUS
+ER_SPECIFIC_ACCESS_DENIED_ERROR = 1227
+
+# (host, port) -> (checked at, usable) for the replicas of this worker
+_replica_health = {}
+# replicas already reported as not allowing the lag check
+_replica_lag_denied = set()
+
+
+def _connect(host, port, **kwargs):
+    return MySQLdb.connect(host=host, port=port, user=config.MYSQL_USERNAME,
+                           passwd=config.MYSQL_PASSWORD, db=config.MYSQL_DB_NAME, charset='utf8', **kwargs)
+
+
+def get_database_connection():
+    """ Connects to the primary MySQL server. Use it for every write and for reads that must see them. """
+    return _connect(config.MYSQL_HOST, getattr(config, 'MYSQL_PORT', 3306))
+
+
+def _replica_lag(db):
+    """ Returns how many seconds the replica behind db is lagging, or None if it is not replicating """
+    cur = db.cursor()
+    try:
+        cur.execute('SHOW REPLICA STATUS')
+    except MySQLdb.ProgrammingError:
+        # servers older than MySQL 8.0.22 / MariaDB 10.5.1
+        cur.execute('SHOW SLAVE STATUS')
+    row = cur.fetchone()
+    columns = [column[0] for column in cur.description or ()]
+    cur.close()
+    if row is None:
+        return None
+    status = dict(zip(columns, row))
+    if 'Seconds_Behind_Source' in status:
+        return status['Seconds_Behind_Source']
+    return status.get('Seconds_Behind_Master')
+
+
+def _connect_replica(replica):
+    """ Returns a connection to replica if it is reachable and not lagging too much, otherwise None """
+    host, port = replica['host'], replica.get('port', 3306)
+    checked_at, usable = _replica_health.get((host, port), (0, True))
+    fresh = time.monotonic() - checked_at < REPLICA_CHECK_INTERVAL
+    if fresh and not usable:
+        return None
+
+    try:
+        db = _connect(host, port, connect_timeout=REPLICA_CONNECT_TIMEOUT)
+    except MySQLdb.Error as e:
+        print(f'read replica {host}:{port} is not reachable; {e}')
+        _replica_health[(host, port)] = (time.monotonic(), False)
+        return None
+
+    if fresh:
+        return db
+
+    try:
+        lag = _replica_lag(db)
+    except MySQLdb.Error as e:
+        if e.args and e.args[0] == ER_SPECIFIC_ACCESS_DENIED_ERROR:
+            if (host, port) not in _replica_lag_denied:
+                _replica_lag_denied.add((host, port))
+                print(f'read replica {host}:{port} is not used: {config.MYSQL_USERNAME} needs the REPLICATION CLIENT '
+                      f'privilege to check its lag (GRANT REPLICATION CLIENT ON *.* TO ...); {e}')
+        else:
+            print(f'can not check lag of read replica {host}:{port}; {e}')
+        _replica_health[(host, port)] = (time.monotonic(), False)
+        db.close()
+        return None
+    usable = lag is not None and lag <= getattr(config, 'MYSQL_MAX_REPLICA_LAG', 5)
+    _replica_health[(host, port)] = (time.monotonic(), usable)
+    if not usable:
+        if lag is None:
+            print(f'read replica {host}:{port} is not replicating, skipping it')
+        else:
+            print(f'read replica {host}:{port} is lagging ({lag} seconds), skipping it')
+        db.close()
+        return None
+    return db
+
+
+def get_read_connection():
+    """ Connects to a random healthy read replica from config.MYSQL_READ_REPLICAS for lookups and dashboard
+    queries. Falls back to the primary if no replica is configured, reachable or close enough to the primary. """
+    replicas = list(getattr(config, 'MYSQL_READ_REPLICAS', []))
+    random.shuffle(replicas)
+    for replica in replicas:
+        db = _connect_replica(replica)
+        if db is not None:
+            return db
+    return get_database_connection()
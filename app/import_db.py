@@ -5,8 +5,9 @@ import sys
 import re
 
 import config
-import MySQLdb
+from database import get_database_connection
 from pandas import read_excel
+from snapshot import read_generation, write_snapshot
 
 MAX_FLASH = 100
 
@@ -45,15 +46,6 @@ def normalize_string(serial_number, fixed_size=30):
     return f"{all_alpha}{missing_zeros}{all_digit}"
 
 
-def get_database_connection():
-    """connects to the MySQL database and returns the connection"""
-    return MySQLdb.connect(host=config.MYSQL_HOST,
-                           user=config.MYSQL_USERNAME,
-                           passwd=config.MYSQL_PASSWORD,
-                           db=config.MYSQL_DB_NAME,
-                           charset='utf8')
-
-
 def import_database_from_excel(filepath):
     """ gets an excel file name and imports lookup data (data and failures) from it
     the first (0) sheet contains serial data like:
@@ -269,9 +261,58 @@ def db_check():
     db.close()
 
 
+def remove_lookup_snapshot():
+    """ removes the lookup snapshot file so the web workers read from the db while the tables are rebuilt
+    returns the generation of the removed snapshot (0 if there was none) """
+
+    # configs from before the snapshot was added have no SNAPSHOT_FILE_PATH, keep reading from the db
+    snapshot_path = getattr(config, 'SNAPSHOT_FILE_PATH', None)
+    if snapshot_path is None:
+        return 0
+
+    generation = read_generation(snapshot_path)
+    if os.path.exists(snapshot_path):
+        os.remove(snapshot_path)
+    return generation
+
+
+def write_lookup_snapshot(generation):
+    """ writes the imported serials and invalids to the lookup snapshot file used by the web workers
+    with the given generation number, so running workers swap to it on their next lookup """
+
+    snapshot_path = getattr(config, 'SNAPSHOT_FILE_PATH', None)
+    if snapshot_path is None:
+        return
+
+    db = get_database_connection()
+    cur = db.cursor()
+
+    try:
+        cur.execute(
+            "SELECT ref, description, start_serial, end_serial, date, text1, text2 FROM serials")
+        serials = [(ref, description, start_serial, end_serial, date.date() if date else None, text1, text2)
+                   for ref, description, start_serial, end_serial, date, text1, text2 in cur.fetchall()]
+        cur.execute("SELECT invalid_serial FROM invalids")
+        invalids = [invalid_serial for (invalid_serial,) in cur.fetchall()]
+
+        write_snapshot(snapshot_path, generation, serials, invalids)
+        print(f'lookup snapshot generation {generation} written')
+    except Exception as e:
+        # without a snapshot the workers keep reading from the db, which is never stale
+        print(f'problem writing lookup snapshot; {e}')
+
+    db.close()
+
+
 filepath = sys.argv[1]
 
-import_database_from_excel(filepath)
-db_check()
+# the tables are dropped and refilled from here on, so the old snapshot must not answer anymore.
+# the new one is written even if the import or the db check fails, to match whatever is in the db.
+snapshot_generation = remove_lookup_snapshot() + 1
+try:
+    import_database_from_excel(filepath)
+    db_check()
+finally:
+    write_lookup_snapshot(snapshot_generation)
 
 os.remove(filepath)
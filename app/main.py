@@ -1,4 +1,3 @@
-import datetime
 import os
 import re
 import time
@@ -8,20 +7,19 @@ from textwrap import dedent
 import requests
 from flask import (
     Flask,
-    Response,
     abort,
     flash,
     jsonify,
     redirect,
     render_template,
     request,
-    url_for,
 )
 
 from werkzeug.utils import secure_filename
 
 import config
-import MySQLdb
+from database import get_database_connection, get_read_connection
+from snapshot import SnapshotReader
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_login import (
@@ -32,7 +30,6 @@ from flask_login import (
     login_user,
     logout_user,
 )
-from pandas import read_excel
 
 
 # Sample flask object
@@ -48,6 +45,11 @@ UPLOAD_FOLDER = config.UPLOAD_FOLDER
 ALLOWED_EXTENSIONS = config.ALLOWED_EXTENSIONS
 CALL_BACK_TOKEN = config.CALL_BACK_TOKEN
 
+# Lookup snapshot written by import_db.py, mapped once per worker and shared through the page cache
+# (configs without SNAPSHOT_FILE_PATH keep reading from the db)
+snapshot_reader = SnapshotReader(getattr(config, 'SNAPSHOT_FILE_PATH', None))
+snapshot_reader.get()
+
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
 # flask-login
@@ -85,7 +87,7 @@ user = User(0)
 def db_status():
     """ show some status about the DB """
 
-    db = get_database_connection()
+    db = get_read_connection()
     cur = db.cursor()
 
     # collect some stats for the GUI
@@ -119,8 +121,15 @@ def db_status():
     except:
         log_db_check = 'Can not read db_check logs... yet'
 
+    snapshot = snapshot_reader.get()
+    if snapshot is not None:
+        snapshot_generation = snapshot.generation
+    else:
+        snapshot_generation = 'no snapshot, reading from db'
+
     return render_template('db_status.html', data={'serials': num_serials, 'invalids': num_invalids,
-                                                   'log_import': log_import, 'log_db_check': log_db_check, 'log_filename': log_filename})
+                                                   'log_import': log_import, 'log_db_check': log_db_check, 'log_filename': log_filename,
+                                                   'snapshot_generation': snapshot_generation})
 
 
 @app.route('/', methods=['GET', 'POST'])
@@ -147,8 +156,8 @@ def home():
                 'File uploaded. Will be imported soon. Follow from DB Status page.', 'info')
             return redirect('/')
 
-    # Init mysql connection
-    db = get_database_connection()
+    # Init mysql connection, the dashboard reads from a replica when there is one
+    db = get_read_connection()
 
     cur = db.cursor()
 
@@ -260,11 +269,6 @@ def health_check():
     return jsonify(ret), 200
 
 
-def get_database_connection():
-    return MySQLdb.connect(host=config.MYSQL_HOST, user=config.MYSQL_USERNAME,
-                           passwd=config.MYSQL_PASSWORD, db=config.MYSQL_DB_NAME, charset='utf8')
-
-
 def send_sms(receptor, message):
     """ This function will get a MSISDN and a message, then uses KaveNegar to send sms.  """
     url = f'https://api.kavenegar.com/v1/{config.API_KEY}/sms/send.json'
@@ -307,55 +311,74 @@ def normalize_string(serial_number, fixed_size=30):
     return f'{all_alpha}{missing_zeros}{all_digit}'
 
 
-def check_serial(serial):
-    """ this function will get one serial number and return appropriate answer to that, after consulting the db. """
-
-    original_serial = serial
-    serial = normalize_string(serial)
+def lookup_serial(serial):
+    """ Gets a normalized serial and returns (is_invalid, rows) where rows are at most two
+    (ref, description, date, text1, text2) matches. Uses the lookup snapshot if there is one, otherwise the db. """
+    snapshot = snapshot_reader.get()
+    if snapshot is not None:
+        if snapshot.is_invalid(serial):
+            return True, []
+        return False, snapshot.find_serials(serial, limit=2)
 
     # Init mysql connection
-    db = get_database_connection()
+    db = get_read_connection()
 
     with db.cursor() as cur:
         # Get result invalid serial from db
         results = cur.execute(
             "SELECT * FROM invalids WHERE invalid_serial = %s", (serial,))
-        print(serial)
-        # Check results invalid
         if results > 0:
-            answer = dedent(f"""
-                {original_serial}
-                این شماره هولوگرام یافت نشد. لطفا دوباره سعی کنید و یا با واحد پشتیبانی تماس حاصل فرمایید.
-                ساختار صحیح شماره هولوگرام به صورت دو حرف انگلیسی و ۷ یا ۸ رقم در دنباله آن می باشد. مثال FA1234567
-                شماره تماس با بخش پشتیبانی فروش شرکت ایران تم
-                ۰۲۱-۰۰۰۰۰۰۰۰""")
-            return 'FAILURE', answer
+            db.close()
+            return True, []
 
         # Get result serial valid from db
-        results = cur.execute(
-            "SELECT * FROM serials WHERE start_serial <= %s and end_serial >= %s", (serial, serial))
-        # Double status result
-        if results > 1:
-            answer = dedent(f"""
-                {original_serial}
-                این شماره هولوگرام مورد تایید است.
-                برای اطلاعات بیشتر از نوع محصول با بخش پشتیبانی فروش شرکت ایران تم تماس حاصل فرمایید.
-                ۰۲۱-۰۰۰۰۰۰۰۰""")
-            return 'DOUBLE', answer
-        # Check results valid individual
-        elif results == 1:
-            ret = cur.fetchone()
-            desc = ret[2]
-            ref_number = ret[1]
-            date = ret[5].date()
-            rettext = ret[6] + '\n' + ret[7]
-            answer = dedent(f"""
-                {original_serial}
-                {ref_number}
-                {desc}
-                Hologram date: {date}
-                {rettext}""")
-            return 'OK', answer
+        cur.execute(
+            "SELECT ref, description, date, text1, text2 FROM serials WHERE start_serial <= %s and end_serial >= %s LIMIT 2", (serial, serial))
+        rows = [(ref, description, date.date(), text1, text2)
+                for ref, description, date, text1, text2 in cur.fetchall()]
+
+    db.close()
+    return False, rows
+
+
+def check_serial(serial):
+    """ this function will get one serial number and return appropriate answer to that, after consulting the db. """
+
+    original_serial = serial
+    serial = normalize_string(serial)
+    print(serial)
+
+    invalid, rows = lookup_serial(serial)
+
+    # Check results invalid
+    if invalid:
+        answer = dedent(f"""
+            {original_serial}
+            این شماره هولوگرام یافت نشد. لطفا دوباره سعی کنید و یا با واحد پشتیبانی تماس حاصل فرمایید.
+            ساختار صحیح شماره هولوگرام به صورت دو حرف انگلیسی و ۷ یا ۸ رقم در دنباله آن می باشد. مثال FA1234567
+            شماره تماس با بخش پشتیبانی فروش شرکت ایران تم
+            ۰۲۱-۰۰۰۰۰۰۰۰""")
+        return 'FAILURE', answer
+
+    # Double status result
+    if len(rows) > 1:
+        answer = dedent(f"""
+            {original_serial}
+            این شماره هولوگرام مورد تایید است.
+            برای اطلاعات بیشتر از نوع محصول با بخش پشتیبانی فروش شرکت ایران تم تماس حاصل فرمایید.
+            ۰۲۱-۰۰۰۰۰۰۰۰""")
+        return 'DOUBLE', answer
+    # Check results valid individual
+    elif len(rows) == 1:
+        ref_number, desc, date, text1, text2 = rows[0]
+        rettext = text1 + '\n' + text2
+        answer = dedent(f"""
+            {original_serial}
+            {ref_number}
+            {desc}
+            Hologram date: {date}
+            {rettext}""")
+        return 'OK', answer
 
     # Return not found status if results not found any serials
     answer = dedent(f"""
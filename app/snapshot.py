@@ -0,0 +1,206 @@
+import mmap
+import os
+import struct
+
+# File layout (all integers little endian):
+#   header   | magic, version, generation, number of serials, number of invalids
+#   ranges   | one fixed size record per serial row, sorted by start serial
+#   invalids | one fixed size record per invalid serial, sorted
+#   rows     | ref, description, date, text1 and text2 of each serial row
+MAGIC = b'SMSSNAP\x00'
+VERSION = 1
+SERIAL_SIZE = 30
+
+HEADER = struct.Struct('<8sIQII')
+# start serial, end serial, max end serial of all previous ranges, row offset
+RANGE = struct.Struct(f'<{SERIAL_SIZE}s{SERIAL_SIZE}s{SERIAL_SIZE}sQ')
+INVALID = struct.Struct(f'<{SERIAL_SIZE}s')
+ROW_LENGTHS = struct.Struct('<5I')
+
+
+def _lookup_key(serial):
+    """ Encodes a normalized serial to the fixed size key stored in the snapshot,
+    or returns None if it is too long to be in a snapshot """
+    key = serial.encode('utf-8')
+    if len(key) > SERIAL_SIZE:
+        return None
+    return key.ljust(SERIAL_SIZE, b'\x00')
+
+
+def _encode_serial(serial):
+    key = _lookup_key(serial)
+    if key is None:
+        raise ValueError(f'serial {serial} is longer than {SERIAL_SIZE} bytes')
+    return key
+
+
+def _encode_row(ref, description, date, text1, text2):
+    fields = [('' if field is None else str(field)).encode('utf-8')
+              for field in (ref, description, date, text1, text2)]
+    return ROW_LENGTHS.pack(*(len(field) for field in fields)) + b''.join(fields)
+
+
+def read_generation(path):
+    """ Returns the generation of the snapshot file at path or 0 if there is no valid snapshot """
+    try:
+        with open(path, 'rb') as f:
+            magic, version, generation, _, _ = HEADER.unpack(
+                f.read(HEADER.size))
+    except (OSError, struct.error):
+        return 0
+    if magic != MAGIC or version != VERSION:
+        return 0
+    return generation
+
+
+def write_snapshot(path, generation, serials, invalids):
+    """ Writes a lookup snapshot to path.
+    serials is an iterable of (ref, description, start_serial, end_serial, date, text1, text2)
+    with normalized start and end serials, invalids is an iterable of normalized invalid serials.
+    The file is written next to path and then renamed, so readers never see a half written snapshot. """
+    # sort by the keys only, duplicated ranges may have None and str in the same field
+    ranges = sorted(((_encode_serial(start_serial), _encode_serial(end_serial), ref, description, date, text1, text2)
+                     for ref, description, start_serial, end_serial, date, text1, text2 in serials),
+                    key=lambda r: (r[0], r[1]))
+    invalid_keys = sorted({_encode_serial(serial) for serial in invalids})
+
+    rows_offset = HEADER.size + RANGE.size * \
+        len(ranges) + INVALID.size * len(invalid_keys)
+
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, generation,
+                len(ranges), len(invalid_keys)))
+
+        rows = []
+        row_offset = rows_offset
+        max_end = b''
+        for start_key, end_key, ref, description, date, text1, text2 in ranges:
+            max_end = max(max_end, end_key)
+            f.write(RANGE.pack(start_key, end_key, max_end, row_offset))
+            row = _encode_row(ref, description, date, text1, text2)
+            rows.append(row)
+            row_offset += len(row)
+
+        for key in invalid_keys:
+            f.write(INVALID.pack(key))
+
+        for row in rows:
+            f.write(row)
+
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp_path, path)
+
+
+class Snapshot:
+    """ A read only, memory mapped lookup snapshot. All processes mapping the same file share one page cache copy. """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.stat = os.fstat(f.fileno())
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self.generation, self.num_serials, self.num_invalids = HEADER.unpack_from(
+            self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a version {VERSION} snapshot')
+
+        self._ranges_offset = HEADER.size
+        self._invalids_offset = self._ranges_offset + RANGE.size * self.num_serials
+        rows_offset = self._invalids_offset + INVALID.size * self.num_invalids
+        if len(self._map) < rows_offset:
+            raise ValueError(
+                f'{path} is truncated, {len(self._map)} bytes but ranges and invalids need {rows_offset}')
+
+    def _range(self, index):
+        return RANGE.unpack_from(self._map, self._ranges_offset + RANGE.size * index)
+
+    def _invalid(self, index):
+        return INVALID.unpack_from(self._map, self._invalids_offset + INVALID.size * index)[0]
+
+    def _row(self, offset):
+        lengths = ROW_LENGTHS.unpack_from(self._map, offset)
+        offset += ROW_LENGTHS.size
+        fields = []
+        for length in lengths:
+            fields.append(self._map[offset:offset + length].decode('utf-8'))
+            offset += length
+        return tuple(fields)
+
+    def is_invalid(self, serial):
+        """ Returns True if the normalized serial is in the invalids list """
+        key = _lookup_key(serial)
+        if key is None:
+            return False
+        low, high = 0, self.num_invalids
+        while low < high:
+            middle = (low + high) // 2
+            if self._invalid(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low < self.num_invalids and self._invalid(low) == key
+
+    def find_serials(self, serial, limit=2):
+        """ Returns at most limit rows of (ref, description, date, text1, text2) whose range contains the normalized serial """
+        key = _lookup_key(serial)
+        if key is None:
+            return []
+
+        # find the first range which starts after the serial
+        low, high = 0, self.num_serials
+        while low < high:
+            middle = (low + high) // 2
+            if self._range(middle)[0] <= key:
+                low = middle + 1
+            else:
+                high = middle
+
+        # walk back while some earlier range can still reach the serial
+        found = []
+        index = low - 1
+        while index >= 0 and len(found) < limit:
+            _, end_key, max_end, row_offset = self._range(index)
+            if max_end < key:
+                break
+            if end_key >= key:
+                found.append(self._row(row_offset))
+            index -= 1
+        return found
+
+
+class SnapshotReader:
+    """ Keeps the latest snapshot at path mapped and swaps to a new one when the import writes a new generation """
+
+    def __init__(self, path):
+        self.path = path
+        self.snapshot = None
+
+    def get(self):
+        """ Returns the current Snapshot or None if there is no usable snapshot file or path is None """
+        if self.path is None:
+            return None
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            self.snapshot = None
+            return None
+
+        current = self.snapshot
+        if current is not None and (current.stat.st_ino, current.stat.st_mtime_ns) == (stat.st_ino, stat.st_mtime_ns):
+            return current
+
+        try:
+            snapshot = Snapshot(self.path)
+        except (OSError, ValueError, struct.error) as e:
+            print(f'can not load lookup snapshot {self.path}; {e}')
+            return current
+
+        if current is None or snapshot.generation != current.generation:
+            print(
+                f'loaded lookup snapshot {self.path} generation {snapshot.generation}')
+        # old maps are closed when the last request using them drops its reference
+        self.snapshot = snapshot
+        return snapshot
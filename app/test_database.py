@@ -0,0 +1,200 @@
+import sys
+import types
+import unittest
+from unittest import mock
+
+import MySQLdb
+
+# database.py reads its settings from config.py, which every test replaces below
+try:
+    import config  # noqa: F401
+except ImportError:
+    sys.modules['config'] = types.ModuleType('config')
+
+import database  # noqa: E402
+
+PRIMARY = ('primary', 3306)
+REPLICA = {'host': 'replica', 'port': 3307}
+OTHER_REPLICA = {'host': 'other', 'port': 3308}
+
+
+def replica_status(lag, column='Seconds_Behind_Source'):
+    """ a SHOW REPLICA STATUS result with the given lag """
+    return [('Replica_IO_State',), (column,)], ('Waiting for source', lag)
+
+
+class FakeCursor:
+    """ answers each statement from responses: an exception to raise or a (description, row) tuple """
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.description = None
+        self.row = None
+
+    def execute(self, sql):
+        response = self.responses[sql]
+        if isinstance(response, Exception):
+            raise response
+        self.description, self.row = response
+
+    def fetchone(self):
+        return self.row
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+
+    def __init__(self, host, port, responses):
+        self.host, self.port = host, port
+        self.responses = responses
+        self.statements = []
+        self.closed = False
+
+    def cursor(self):
+        cursor = FakeCursor(self.responses)
+        original_execute = cursor.execute
+
+        def execute(sql):
+            self.statements.append(sql)
+            original_execute(sql)
+        cursor.execute = execute
+        return cursor
+
+    def close(self):
+        self.closed = True
+
+
+class ReadRoutingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.config = types.SimpleNamespace(
+            MYSQL_USERNAME='smsmysql', MYSQL_PASSWORD='test', MYSQL_DB_NAME='smsmysql',
+            MYSQL_HOST=PRIMARY[0], MYSQL_PORT=PRIMARY[1],
+            MYSQL_READ_REPLICAS=[REPLICA], MYSQL_MAX_REPLICA_LAG=5)
+        # (host, port) -> statement responses, or an exception to raise on connect
+        self.servers = {PRIMARY: {}, ('replica', 3307): {'SHOW REPLICA STATUS': replica_status(0)}}
+        self.connections = []
+        self.now = 1000.0
+
+        patches = [
+            mock.patch.object(database, 'config', self.config),
+            mock.patch.object(database, '_replica_health', {}),
+            mock.patch.object(database, '_replica_lag_denied', set()),
+            mock.patch.object(database.MySQLdb, 'connect', side_effect=self.connect),
+            mock.patch.object(database.time, 'monotonic', side_effect=lambda: self.now),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        print_patch = mock.patch('builtins.print')
+        self.print = print_patch.start()
+        self.addCleanup(print_patch.stop)
+
+    def connect(self, host, port, **kwargs):
+        server = self.servers[(host, port)]
+        if isinstance(server, Exception):
+            raise server
+        connection = FakeConnection(host, port, server)
+        self.connections.append(connection)
+        return connection
+
+    def read_host(self):
+        db = database.get_read_connection()
+        return db.host, db.port
+
+    def test_primary_without_replicas(self):
+        self.config.MYSQL_READ_REPLICAS = []
+        self.assertEqual(self.read_host(), PRIMARY)
+
+    def test_old_config_without_new_settings(self):
+        old_config = types.SimpleNamespace(
+            MYSQL_USERNAME='smsmysql', MYSQL_PASSWORD='test', MYSQL_DB_NAME='smsmysql', MYSQL_HOST='primary')
+        with mock.patch.object(database, 'config', old_config):
+            self.assertEqual(self.read_host(), PRIMARY)
+            self.assertEqual(database.get_database_connection().port, 3306)
+
+    def test_primary_port(self):
+        self.config.MYSQL_PORT = 3310
+        self.servers[('primary', 3310)] = {}
+        self.config.MYSQL_READ_REPLICAS = []
+        self.assertEqual(self.read_host(), ('primary', 3310))
+
+    def test_healthy_replica(self):
+        self.assertEqual(self.read_host(), ('replica', 3307))
+
+    def test_lag_threshold(self):
+        self.servers[('replica', 3307)]['SHOW REPLICA STATUS'] = replica_status(5)
+        self.assertEqual(self.read_host(), ('replica', 3307))
+
+        self.now += database.REPLICA_CHECK_INTERVAL
+        self.servers[('replica', 3307)]['SHOW REPLICA STATUS'] = replica_status(6)
+        self.assertEqual(self.read_host(), PRIMARY)
+        replica_connections = [c for c in self.connections if c.host == 'replica']
+        self.assertTrue(replica_connections[-1].closed)
+
+    def test_stopped_replication(self):
+        self.servers[('replica', 3307)]['SHOW REPLICA STATUS'] = replica_status(None)
+        self.assertEqual(self.read_host(), PRIMARY)
+
+    def test_not_a_replica(self):
+        self.servers[('replica', 3307)]['SHOW REPLICA STATUS'] = ([('Replica_IO_State',)], None)
+        self.assertEqual(self.read_host(), PRIMARY)
+
+    def test_unreachable_replica(self):
+        self.servers[('replica', 3307)] = MySQLdb.OperationalError(2003, "Can't connect")
+        self.assertEqual(self.read_host(), PRIMARY)
+
+    def test_falls_back_to_show_slave_status(self):
+        self.servers[('replica', 3307)] = {
+            'SHOW REPLICA STATUS': MySQLdb.ProgrammingError(1064, 'syntax error'),
+            'SHOW SLAVE STATUS': replica_status(1, column='Seconds_Behind_Master'),
+        }
+        self.assertEqual(self.read_host(), ('replica', 3307))
+        self.assertEqual(self.connections[-1].statements, ['SHOW REPLICA STATUS', 'SHOW SLAVE STATUS'])
+
+    def test_missing_replication_client_is_reported_once(self):
+        self.servers[('replica', 3307)]['SHOW REPLICA STATUS'] = MySQLdb.OperationalError(
+            database.ER_SPECIFIC_ACCESS_DENIED_ERROR, 'Access denied; you need the REPLICATION CLIENT privilege')
+        for _ in range(3):
+            self.assertEqual(self.read_host(), PRIMARY)
+            self.now += database.REPLICA_CHECK_INTERVAL
+
+        messages = [call.args[0] for call in self.print.call_args_list]
+        self.assertEqual(len([m for m in messages if 'REPLICATION CLIENT' in m]), 1)
+        self.assertEqual(len([c for c in self.connections if c.host == 'replica']), 3)
+
+    def test_health_is_cached_for_the_check_interval(self):
+        self.assertEqual(self.read_host(), ('replica', 3307))
+        self.assertEqual(self.read_host(), ('replica', 3307))
+        checks = [c for c in self.connections if 'SHOW REPLICA STATUS' in c.statements]
+        self.assertEqual(len(checks), 1)
+
+        self.now += database.REPLICA_CHECK_INTERVAL
+        self.read_host()
+        checks = [c for c in self.connections if 'SHOW REPLICA STATUS' in c.statements]
+        self.assertEqual(len(checks), 2)
+
+    def test_unusable_replica_is_skipped_for_the_check_interval(self):
+        self.servers[('replica', 3307)]['SHOW REPLICA STATUS'] = replica_status(60)
+        self.assertEqual(self.read_host(), PRIMARY)
+
+        self.servers[('replica', 3307)]['SHOW REPLICA STATUS'] = replica_status(0)
+        self.assertEqual(self.read_host(), PRIMARY)
+        self.assertEqual(len([c for c in self.connections if c.host == 'replica']), 1)
+
+        self.now += database.REPLICA_CHECK_INTERVAL
+        self.assertEqual(self.read_host(), ('replica', 3307))
+
+    def test_skips_to_a_healthy_replica(self):
+        self.config.MYSQL_READ_REPLICAS = [REPLICA, OTHER_REPLICA]
+        self.servers[('other', 3308)] = {'SHOW REPLICA STATUS': replica_status(0)}
+        self.servers[('replica', 3307)] = MySQLdb.OperationalError(2003, "Can't connect")
+        for _ in range(5):
+            self.assertEqual(self.read_host(), ('other', 3308))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,162 @@
+import datetime
+import os
+import struct
+import tempfile
+import unittest
+
+from snapshot import (HEADER, MAGIC, RANGE, VERSION, Snapshot, SnapshotReader,
+                      read_generation, write_snapshot)
+
+
+def serial(letters, number):
+    """ builds a normalized serial like normalize_string does """
+    digits = str(number)
+    return f'{letters}{"0" * (30 - len(letters) - len(digits))}{digits}'
+
+
+def row(ref, start, end, text2='text2'):
+    return (ref, f'{ref} description', serial('AB', start), serial('AB', end),
+            datetime.date(2012, 7, 2), 'text1', text2)
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, 'lookup.snapshot')
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write(self, serials, invalids=(), generation=1):
+        write_snapshot(self.path, generation, serials, invalids)
+        return Snapshot(self.path)
+
+    def refs(self, snapshot, number, limit=10):
+        return sorted(found[0] for found in snapshot.find_serials(serial('AB', number), limit=limit))
+
+    def test_single_match_returns_row_fields(self):
+        snapshot = self.write([row('r1', 10, 20)])
+        self.assertEqual(snapshot.find_serials(serial('AB', 15)),
+                         [('r1', 'r1 description', '2012-07-02', 'text1', 'text2')])
+        self.assertEqual(snapshot.find_serials(serial('AB', 10))[0][0], 'r1')
+        self.assertEqual(snapshot.find_serials(serial('AB', 20))[0][0], 'r1')
+        self.assertEqual(snapshot.find_serials(serial('AB', 21)), [])
+        self.assertEqual(snapshot.find_serials(serial('AB', 9)), [])
+        self.assertEqual(snapshot.find_serials(serial('AC', 15)), [])
+
+    def test_overlapping_ranges(self):
+        # r1 is long and reaches past the short ranges that start after it
+        snapshot = self.write([row('r1', 10, 100), row('r2', 20, 30),
+                               row('r3', 40, 50), row('r4', 200, 300)])
+        self.assertEqual(self.refs(snapshot, 25), ['r1', 'r2'])
+        self.assertEqual(self.refs(snapshot, 35), ['r1'])
+        self.assertEqual(self.refs(snapshot, 60), ['r1'])
+        self.assertEqual(self.refs(snapshot, 150), [])
+        self.assertEqual(self.refs(snapshot, 250), ['r4'])
+
+    def test_matches_are_limited_for_double(self):
+        snapshot = self.write([row(f'r{i}', 10, 20 + i) for i in range(5)])
+        self.assertEqual(len(snapshot.find_serials(serial('AB', 15))), 2)
+        self.assertEqual(len(self.refs(snapshot, 15)), 5)
+
+    def test_duplicated_ranges_with_none_fields(self):
+        snapshot = self.write([row('r1', 10, 20, text2=None),
+                               row('r2', 10, 20, text2='text2')])
+        self.assertEqual(self.refs(snapshot, 15), ['r1', 'r2'])
+
+    def test_walk_back_matches_brute_force(self):
+        serials = [row(f'r{i}', start, start + (i * 37) % 400)
+                   for i, start in enumerate(range(0, 10000, 13))]
+        snapshot = self.write(serials)
+        for number in range(0, 10500, 7):
+            key = serial('AB', number)
+            expected = sorted(r[0] for r in serials if r[2] <= key <= r[3])
+            self.assertEqual(self.refs(snapshot, number, limit=len(serials)), expected)
+
+    def test_invalids(self):
+        snapshot = self.write([], [serial('AB', 5), serial('FA', 1234567), serial('AB', 5)])
+        self.assertEqual(snapshot.num_invalids, 2)
+        self.assertTrue(snapshot.is_invalid(serial('AB', 5)))
+        self.assertTrue(snapshot.is_invalid(serial('FA', 1234567)))
+        self.assertFalse(snapshot.is_invalid(serial('AB', 6)))
+
+    def test_empty_snapshot(self):
+        snapshot = self.write([], [])
+        self.assertEqual(snapshot.find_serials(serial('AB', 1)), [])
+        self.assertFalse(snapshot.is_invalid(serial('AB', 1)))
+
+    def test_oversized_keys(self):
+        oversized = 'HELLOPLEASECHECKMYSERIALFA1234567'
+        snapshot = self.write([row('r1', 10, 20)], [serial('AB', 5)])
+        self.assertEqual(snapshot.find_serials(oversized), [])
+        self.assertFalse(snapshot.is_invalid(oversized))
+        with self.assertRaises(ValueError):
+            write_snapshot(self.path, 2, [], [oversized])
+
+    def test_generation(self):
+        self.assertEqual(read_generation(self.path), 0)
+        self.write([], generation=7)
+        self.assertEqual(read_generation(self.path), 7)
+
+    def test_bad_header(self):
+        with open(self.path, 'wb') as f:
+            f.write(HEADER.pack(b'NOTSNAP\x00', VERSION, 1, 0, 0))
+        with self.assertRaises(ValueError):
+            Snapshot(self.path)
+        self.assertEqual(read_generation(self.path), 0)
+
+        with open(self.path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION + 1, 1, 0, 0))
+        with self.assertRaises(ValueError):
+            Snapshot(self.path)
+        self.assertEqual(read_generation(self.path), 0)
+
+    def test_empty_or_truncated_file(self):
+        open(self.path, 'wb').close()
+        with self.assertRaises(ValueError):
+            Snapshot(self.path)
+        self.assertEqual(read_generation(self.path), 0)
+
+        with open(self.path, 'wb') as f:
+            f.write(MAGIC)
+        with self.assertRaises(struct.error):
+            Snapshot(self.path)
+
+        # a valid header with part of the ranges and invalids cut off
+        self.write([row('r1', 10, 20), row('r2', 30, 40)], [serial('AB', 5)])
+        with open(self.path, 'r+b') as f:
+            f.truncate(HEADER.size + RANGE.size + 10)
+        with self.assertRaises(ValueError):
+            Snapshot(self.path)
+
+        reader = SnapshotReader(self.path)
+        self.assertIsNone(reader.get())
+
+    def test_reader_swaps_generations(self):
+        reader = SnapshotReader(self.path)
+        self.assertIsNone(reader.get())
+
+        self.write([row('r1', 10, 20)], generation=1)
+        first = reader.get()
+        self.assertEqual(first.generation, 1)
+        self.assertIs(reader.get(), first)
+
+        self.write([row('r2', 10, 20)], generation=2)
+        self.assertEqual(reader.get().generation, 2)
+        self.assertEqual(reader.get().find_serials(serial('AB', 15))[0][0], 'r2')
+
+        # a broken file keeps the last good snapshot
+        with open(self.path, 'wb') as f:
+            f.write(b'garbage')
+        self.assertEqual(reader.get().generation, 2)
+
+        os.remove(self.path)
+        self.assertIsNone(reader.get())
+
+    def test_reader_without_path(self):
+        self.assertIsNone(SnapshotReader(None).get())
+
+
+if __name__ == '__main__':
+    unittest.main()